@@ -1,15 +1,39 @@
 from pathlib import Path
-import sqlite3
+import aiosqlite
+import orjson
+from aiosqlitepool import SQLiteConnectionPool
+from async_lru import alru_cache
 from fastapi import FastAPI
-from pydantic import BaseModel
+from fastapi.responses import JSONResponse, Response
+from pydantic import BaseModel, ConfigDict
 from fastapi.middleware.cors import CORSMiddleware
-from typing import Optional
+from typing import Any, Optional
 from fastapi import Query
 
 
 DB_PATH = Path("data/pitchmix.db")
+POOL_SIZE = 8
+CACHE_SIZE = 4096  # cached query results per endpoint; cleared on reload
+CONN_PRAGMAS = """
+PRAGMA journal_mode=WAL;
+PRAGMA synchronous=NORMAL;
+PRAGMA cache_size=-131072;
+PRAGMA mmap_size=1073741824;
+PRAGMA temp_store=MEMORY;
+PRAGMA busy_timeout=5000;
+"""
 
-app = FastAPI()
+# Long-lived connections shared by the async endpoints, so SQLite's page cache
+# stays warm between requests. Created on startup.
+_pool: SQLiteConnectionPool | None = None
+
+
+class ORJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content)
+
+
+app = FastAPI(default_response_class=ORJSONResponse)
 
 # Allow the React dev server origins
 origins = [
@@ -25,37 +49,48 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-def get_conn():
+async def open_conn() -> aiosqlite.Connection:
     # Ensure data directory exists to avoid "unable to open database file"
     DB_PATH.parent.mkdir(exist_ok=True)
-    return sqlite3.connect(DB_PATH)
+    conn = await aiosqlite.connect(DB_PATH, cached_statements=256)
+    await conn.executescript(CONN_PRAGMAS)
+    return conn
+
+
+@app.on_event("startup")
+async def open_pool():
+    global _pool
+    _pool = SQLiteConnectionPool(connection_factory=open_conn, pool_size=POOL_SIZE)
+
+
+@app.on_event("shutdown")
+async def close_pool():
+    await _pool.close()
+
 
-    
 @app.get("/health")
-def health():
+async def health():
     return {"status": "ok"}
 
 
+# Queries are module-level constants (one text per variant) so every call hits
+# the pooled connections' prepared statement cache.
+_SQL_PITCHERS = "SELECT id, name, throws_hand FROM pitchers ORDER BY name"
+
+
 @app.get("/api/pitchers")
-def list_pitchers():
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("SELECT id, name, throws_hand FROM pitchers ORDER BY name")
-    rows = cur.fetchall()
-    conn.close()
+async def list_pitchers():
+    async with _pool.connection() as conn:
+        async with conn.execute(_SQL_PITCHERS) as cur:
+            rows = await cur.fetchall()
     return [
         {"id": r[0], "name": r[1], "throws_hand": r[2]}
         for r in rows
     ]
 
 class RecommendationRequest(BaseModel):
-    pitcher_id: int
-    balls: int
-    strikes: int
-    batter_hand: str
-    last_pitch_type: str | None = None
+    model_config = ConfigDict(frozen=True, extra="forbid")
 
-class RecommendationRequest(BaseModel):
     pitcher_id: int
     balls: int
     strikes: int
@@ -63,56 +98,68 @@ class RecommendationRequest(BaseModel):
     last_pitch_type: str | None = None
 
 
-@app.post("/api/recommendation")
-def recommend_pitch(req: RecommendationRequest):
-    conn = get_conn()
-    cur = conn.cursor()
-
-    cur.execute(
-        """
-        SELECT
-            pitch_type,
-            COUNT(*) AS total,
-            SUM(CASE WHEN description LIKE 'swinging_strike%' THEN 1 ELSE 0 END) AS whiffs,
-            SUM(CASE WHEN outcome IN ('home_run', 'double', 'triple') THEN 1 ELSE 0 END) AS hard_hits
-        FROM pitches
-        WHERE pitcher_id = ?
-          AND balls = ?
-          AND strikes = ?
-          AND batter_hand = ?
-          AND pitch_type IS NOT NULL
-        GROUP BY pitch_type
-        HAVING total >= 5
-        """,
-        (req.pitcher_id, req.balls, req.strikes, req.batter_hand),
-    )
+# Rank the hand-specific and all-hands splits in one round trip; hand-specific
+# candidates win whenever there are any.
+_SQL_RECOMMEND = """
+WITH candidates AS (
+    SELECT pitch_type, total, whiffs, hard_hits, 1 AS hand_specific
+    FROM pitch_agg
+    WHERE pitcher_id = ?
+      AND balls = ?
+      AND strikes = ?
+      AND batter_hand = ?
+      AND total >= 5
+    UNION ALL
+    SELECT
+        pitch_type,
+        SUM(total) AS total,
+        SUM(whiffs) AS whiffs,
+        SUM(hard_hits) AS hard_hits,
+        0 AS hand_specific
+    FROM pitch_agg
+    WHERE pitcher_id = ?
+      AND balls = ?
+      AND strikes = ?
+    GROUP BY pitch_type
+    HAVING SUM(total) >= 5
+)
+SELECT
+    pitch_type,
+    total,
+    CAST(whiffs AS REAL) / total AS whiff_pct,
+    CAST(hard_hits AS REAL) / total AS hard_hit_pct
+FROM candidates
+ORDER BY
+    hand_specific DESC,
+    whiff_pct - hard_hit_pct DESC,  -- simple heuristic
+    pitch_type
+LIMIT 1
+"""
+
+
+@alru_cache(maxsize=CACHE_SIZE)
+async def _best_pitch(
+    pitcher_id: int, balls: int, strikes: int, batter_hand: Optional[str]
+):
+    async with _pool.connection() as conn:
+        async with conn.execute(
+            _SQL_RECOMMEND,
+            (
+                pitcher_id, balls, strikes, batter_hand,
+                pitcher_id, balls, strikes,
+            ),
+        ) as cur:
+            return await cur.fetchone()
 
-    rows = cur.fetchall()
-
-    # if no rows for that exact hand + count, fall back to all hands
-    if not rows:
-        cur.execute(
-            """
-            SELECT
-                pitch_type,
-                COUNT(*) AS total,
-                SUM(CASE WHEN description LIKE 'swinging_strike%' THEN 1 ELSE 0 END) AS whiffs,
-                SUM(CASE WHEN outcome IN ('home_run', 'double', 'triple') THEN 1 ELSE 0 END) AS hard_hits
-            FROM pitches
-            WHERE pitcher_id = ?
-              AND balls = ?
-              AND strikes = ?
-              AND pitch_type IS NOT NULL
-            GROUP BY pitch_type
-            HAVING total >= 5
-            """,
-            (req.pitcher_id, req.balls, req.strikes),
-        )
-        rows = cur.fetchall()
 
-    conn.close()
+@app.post("/api/recommendation")
+async def recommend_pitch(req: RecommendationRequest):
+    # Only 'L' / 'R' get a hand-specific split; anything else (including the
+    # '' pitch_agg uses for unknown hands) binds NULL and falls back to all hands
+    batter_hand = req.batter_hand if req.batter_hand in ("L", "R") else None
+    best_pitch = await _best_pitch(req.pitcher_id, req.balls, req.strikes, batter_hand)
 
-    if not rows:
+    if best_pitch is None:
         # Really no data; return a low-confidence default
         return {
             "recommended_pitch_type": "FF",
@@ -127,18 +174,8 @@ def recommend_pitch(req: RecommendationRequest):
             },
         }
 
-    best_pitch = None
-    best_score = -999.0
-
-    for pitch_type, total, whiffs, hard_hits in rows:
-        whiff_pct = whiffs / total if total else 0.0
-        hard_hit_pct = hard_hits / total if total else 0.0
-        score = whiff_pct - hard_hit_pct  # simple heuristic
-        if score > best_score:
-            best_score = score
-            best_pitch = (pitch_type, total, whiff_pct, hard_hit_pct)
-
     pitch_type, total, whiff_pct, hard_hit_pct = best_pitch
+    best_score = whiff_pct - hard_hit_pct
 
     return {
         "recommended_pitch_type": pitch_type,
@@ -153,70 +190,123 @@ def recommend_pitch(req: RecommendationRequest):
         },
     }
 
+
+_SQL_USAGE_TEMPLATE = """
+SELECT
+    balls || '-' || strikes AS count_key,
+    pitch_type,
+    SUM(total) AS total,
+    CAST(SUM(whiffs) AS REAL) / SUM(total) AS whiff_pct,
+    CAST(SUM(hard_hits) AS REAL) / SUM(total) AS hard_hit_pct
+FROM pitch_agg
+WHERE pitcher_id = ?
+  {}
+GROUP BY balls, strikes, pitch_type
+ORDER BY balls, strikes, pitch_type
+"""
+_SQL_USAGE = _SQL_USAGE_TEMPLATE.format("")
+_SQL_USAGE_HAND = _SQL_USAGE_TEMPLATE.format("AND batter_hand = ?")
+
+
+@alru_cache(maxsize=CACHE_SIZE)
+async def _usage_by_count(pitcher_id: int, batter_hand: Optional[str]):
+    if batter_hand is None:
+        sql, params = _SQL_USAGE, (pitcher_id,)
+    else:
+        sql, params = _SQL_USAGE_HAND, (pitcher_id, batter_hand)
+
+    async with _pool.connection() as conn:
+        async with conn.execute(sql, params) as cur:
+            rows = await cur.fetchall()
+
+    # Shaped once per cache entry; cached hits reuse the finished mapping
+    usage_by_count: dict[str, list[dict]] = {}
+    for count_key, pitch_type, total, whiff_pct, hard_hit_pct in rows:
+        usage_by_count.setdefault(count_key, []).append(
+            {
+                "pitch_type": pitch_type,
+                "total": total,
+                "whiff_pct": whiff_pct,
+                "hard_hit_pct": hard_hit_pct,
+            }
+        )
+    return usage_by_count
+
+
 @app.get("/api/pitchers/{pitcher_id}/usage")
-def pitcher_usage(
+async def pitcher_usage(
     pitcher_id: int,
     batter_hand: Optional[str] = Query(
         None, description="Filter by batter hand: 'L' or 'R'"
     ),
 ):
-    conn = get_conn()
-    cur = conn.cursor()
+    # Only filter if a valid hand is provided
+    usage_by_count = await _usage_by_count(
+        pitcher_id, batter_hand if batter_hand in ("L", "R") else None
+    )
 
-    params: list = [pitcher_id]
-    hand_clause = ""
+    return {"pitcher_id": pitcher_id, "usage_by_count": usage_by_count}
 
-    # Only filter if a valid hand is provided
-    if batter_hand in ("L", "R"):
-        hand_clause = "AND batter_hand = ?"
-        params.append(batter_hand)
+@app.post("/api/admin/reload")
+async def reload_caches():
+    """
+    Drop cached recommendation and usage results. Call this after re-running
+    the ETL against a live server.
+    """
+    _best_pitch.cache_clear()
+    _usage_by_count.cache_clear()
+    return {"status": "ok"}
 
-    cur.execute(
-        f"""
-        SELECT 
-            balls,
-            strikes,
-            pitch_type,
-            COUNT(*) AS total,
-            SUM(CASE WHEN description LIKE 'swinging_strike%' THEN 1 ELSE 0 END) AS whiffs,
-            SUM(CASE WHEN outcome IN ('home_run', 'triple', 'double') THEN 1 ELSE 0 END) AS hard_hits
-        FROM pitches
-        WHERE pitcher_id = ?
-          AND balls IS NOT NULL
-          AND strikes IS NOT NULL
-          AND pitch_type IS NOT NULL
-          {hand_clause}
-        GROUP BY balls, strikes, pitch_type
-        ORDER BY balls, strikes, pitch_type
-        """,
-        params,
-    )
-    rows = cur.fetchall()
-    conn.close()
 
-    usage_by_count: dict[str, list[dict]] = {}
-    for balls, strikes, pitch_type, total, whiffs, hard_hits in rows:
-        count_key = f"{balls}-{strikes}"
-        if count_key not in usage_by_count:
-            usage_by_count[count_key] = []
-        whiff_pct = whiffs / total if total else 0.0
-        hard_hit_pct = hard_hits / total if total else 0.0
-        usage_by_count[count_key].append(
-            {
-                "pitch_type": pitch_type,
-                "total": total,
-                "whiff_pct": whiff_pct,
-                "hard_hit_pct": hard_hit_pct,
-            }
+# SQLite renders the whole response document, so the rows never become Python
+# objects and the JSON is not encoded a second time.
+_SQL_PITCHES_TEMPLATE = """
+SELECT json_object(
+    'pitcher_id', ?,
+    'balls', ?,
+    'strikes', ?,
+    'batter_hand', ?,
+    'avg_sz_top', AVG(sz_top),
+    'avg_sz_bot', AVG(sz_bot),
+    'pitches', json_group_array(
+        json_object(
+            'plate_x', plate_x,
+            'plate_z', plate_z,
+            'pitch_type', pitch_type,
+            'description', description,
+            'outcome', outcome
         )
+    )
+)
+FROM (
+    SELECT
+        plate_x,
+        plate_z,
+        sz_top,
+        sz_bot,
+        pitch_type,
+        description,
+        outcome
+    FROM pitches
+    WHERE pitcher_id = ?
+      AND balls = ?
+      AND strikes = ?
+      AND plate_x IS NOT NULL
+      AND plate_z IS NOT NULL
+      {}
+    ORDER BY id
+    LIMIT ?
+)
+"""
+_SQL_PITCHES = _SQL_PITCHES_TEMPLATE.format("")
+_SQL_PITCHES_HAND = _SQL_PITCHES_TEMPLATE.format("AND batter_hand = ?")
 
-    return {"pitcher_id": pitcher_id, "usage_by_count": usage_by_count}
 
 @app.get("/api/pitchers/{pitcher_id}/pitches")
-def pitcher_pitches(
+async def pitcher_pitches(
     pitcher_id: int,
-    balls: int = Query(..., ge0=0, le=3, description="Balls (0–3)"),
-    strikes: int = Query(..., ge0=0, le=2, description="Strikes (0–2)"),
+    balls: int = Query(..., ge=0, le=3, description="Balls (0–3)"),
+    strikes: int = Query(..., ge=0, le=2, description="Strikes (0–2)"),
     batter_hand: Optional[str] = Query(
         None, description="Filter by batter hand: 'L' or 'R'"
     ),
@@ -226,70 +316,20 @@ def pitcher_pitches(
     Return individual pitch locations for a given pitcher and situation,
     plus average sz_top/sz_bot so the frontend can draw the strike zone.
     """
-    conn = get_conn()
-    cur = conn.cursor()
-
-    params: list = [pitcher_id, balls, strikes]
-    hand_clause = ""
+    # json_object header fields first, then the WHERE clause
+    params: list = [pitcher_id, balls, strikes, batter_hand]
+    params += [pitcher_id, balls, strikes]
+    sql = _SQL_PITCHES
 
     if batter_hand in ("L", "R"):
-        hand_clause = "AND batter_hand = ?"
+        sql = _SQL_PITCHES_HAND
         params.append(batter_hand)
 
-    cur.execute(
-        f"""
-        SELECT
-            plate_x,
-            plate_z,
-            sz_top,
-            sz_bot,
-            pitch_type,
-            description,
-            outcome
-        FROM pitches
-        WHERE pitcher_id = ?
-          AND balls = ?
-          AND strikes = ?
-          AND plate_x IS NOT NULL
-          AND plate_z IS NOT NULL
-          {hand_clause}
-        LIMIT ?
-        """,
-        [*params, limit],
-    )
-
-    rows = cur.fetchall()
-    conn.close()
-
-    pitches = []
-    sz_tops = []
-    sz_bots = []
-
-    for plate_x, plate_z, sz_top, sz_bot, pitch_type, description, outcome in rows:
-        if sz_top is not None:
-            sz_tops.append(sz_top)
-        if sz_bot is not None:
-            sz_bots.append(sz_bot)
+    async with _pool.connection() as conn:
+        async with conn.execute(
+            sql,
+            [*params, limit],
+        ) as cur:
+            (body,) = await cur.fetchone()
 
-        pitches.append(
-            {
-                "plate_x": plate_x,
-                "plate_z": plate_z,
-                "pitch_type": pitch_type,
-                "description": description,
-                "outcome": outcome,
-            }
-        )
-
-    avg_sz_top = sum(sz_tops) / len(sz_tops) if sz_tops else None
-    avg_sz_bot = sum(sz_bots) / len(sz_bots) if sz_bots else None
-
-    return {
-        "pitcher_id": pitcher_id,
-        "balls": balls,
-        "strikes": strikes,
-        "batter_hand": batter_hand,
-        "avg_sz_top": avg_sz_top,
-        "avg_sz_bot": avg_sz_bot,
-        "pitches": pitches,
-    }
+    return Response(content=body, media_type="application/json")
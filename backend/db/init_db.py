@@ -3,13 +3,51 @@ from pathlib import Path
 
 DB_PATH = Path("data/pitchmix.db")
 SCHEMA_PATH = Path("db/schema.sql")
+PITCH_FLAGS_PATH = Path("db/pitch_flags.sql")  # also run by the ETL
+PITCH_AGG_PATH = Path("db/pitch_agg.sql")
+
+# File-level settings. page_size and auto_vacuum only apply to a database
+# with no tables yet, so they run before the schema; an existing file keeps
+# its old values until it is VACUUMed.
+PRE_SCHEMA_PRAGMAS = """
+PRAGMA page_size=8192;
+PRAGMA auto_vacuum=INCREMENTAL;
+"""
+# WAL is persistent, so API readers don't block on ETL writes from here on
+POST_SCHEMA_PRAGMAS = """
+PRAGMA journal_mode=WAL;
+"""
+
+# Columns added to pitches after the first release. CREATE TABLE IF NOT EXISTS
+# leaves an existing table alone, so older databases get them here, backfilled
+# with the same SQL the ETL uses.
+PITCH_FLAG_COLUMNS = ("is_whiff", "is_hard_hit")
+
+def migrate(conn: sqlite3.Connection):
+    existing = {row[1] for row in conn.execute("PRAGMA table_info(pitches)")}
+    missing = [name for name in PITCH_FLAG_COLUMNS if name not in existing]
+    if not missing:
+        return
+
+    print(f"Adding {', '.join(missing)} to pitches ...")
+    for name in missing:
+        conn.execute(
+            f"ALTER TABLE pitches ADD COLUMN {name} INTEGER NOT NULL DEFAULT 0"
+        )
+    conn.execute(PITCH_FLAGS_PATH.read_text())
+    # pitch_agg was created empty alongside the columns
+    conn.execute("DELETE FROM pitch_agg")
+    conn.execute(PITCH_AGG_PATH.read_text())
 
 def main():
     DB_PATH.parent.mkdir(exist_ok=True)
     conn = sqlite3.connect(DB_PATH)
+    conn.executescript(PRE_SCHEMA_PRAGMAS)
     with SCHEMA_PATH.open() as f:
         conn.executescript(f.read())
+    migrate(conn)
     conn.commit()
+    conn.executescript(POST_SCHEMA_PRAGMAS)
     conn.close()
 
 if __name__ == "__main__":
@@ -0,0 +1,21 @@
+-- Fills pitch_agg from pitches; callers clear the table first. Shared by the
+-- ETL rebuild and the init_db migration. Keep it to a single statement so it
+-- can run inside the ETL's publish transaction.
+INSERT INTO pitch_agg (
+    pitcher_id, balls, strikes, batter_hand, pitch_type,
+    total, whiffs, hard_hits
+)
+SELECT
+    pitcher_id,
+    balls,
+    strikes,
+    COALESCE(batter_hand, ''),
+    pitch_type,
+    COUNT(*),
+    SUM(is_whiff),
+    SUM(is_hard_hit)
+FROM pitches
+WHERE balls IS NOT NULL
+  AND strikes IS NOT NULL
+  AND pitch_type IS NOT NULL
+GROUP BY 1, 2, 3, 4, 5
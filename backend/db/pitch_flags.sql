@@ -0,0 +1,6 @@
+-- Derives the whiff / hard-hit flags from description and outcome. The ETL
+-- runs it on each freshly loaded shard and init_db uses it to backfill older
+-- databases, so both apply the same rule. Keep it to a single statement.
+UPDATE pitches
+SET is_whiff = COALESCE(description GLOB 'swinging_strike*', 0),
+    is_hard_hit = COALESCE(outcome IN ('home_run', 'double', 'triple'), 0)
@@ -22,5 +22,29 @@ CREATE TABLE IF NOT EXISTS pitches (
     sz_bot REAL,
     description TEXT,
     outcome TEXT,
-    runs_value REAL
+    runs_value REAL,
+    is_whiff INTEGER NOT NULL DEFAULT 0,     -- description is swinging_strike*
+    is_hard_hit INTEGER NOT NULL DEFAULT 0   -- outcome is an extra-base hit
 );
+
+-- Matches the location lookup in /api/pitchers/{id}/pitches. batter_hand is
+-- deliberately left out so entries for a situation stay in rowid order.
+CREATE INDEX IF NOT EXISTS idx_pitches_loc
+    ON pitches (pitcher_id, balls, strikes)
+    WHERE plate_x IS NOT NULL AND plate_z IS NOT NULL;
+
+
+-- Pre-aggregated pitch outcomes per pitcher / count / batter hand, rebuilt by
+-- the ETL so the API can answer with point lookups instead of scanning pitches.
+-- batter_hand is '' for pitches with an unknown hand.
+CREATE TABLE IF NOT EXISTS pitch_agg (
+    pitcher_id INTEGER NOT NULL,
+    balls INTEGER NOT NULL,
+    strikes INTEGER NOT NULL,
+    batter_hand TEXT NOT NULL,
+    pitch_type TEXT NOT NULL,
+    total INTEGER NOT NULL,
+    whiffs INTEGER NOT NULL,
+    hard_hits INTEGER NOT NULL,
+    PRIMARY KEY (pitcher_id, balls, strikes, batter_hand, pitch_type)
+) WITHOUT ROWID;
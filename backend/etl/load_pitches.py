@@ -1,39 +1,166 @@
 import csv
+import os
+import shutil
 import sqlite3
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
+import pyarrow as pa
+import pyarrow.compute as pc
+from pyarrow import csv as pa_csv
+
 DB_PATH = Path("data/pitchmix.db")
 CSV_DIR = Path("data/csvs")  # folder containing many CSV files
-
-
-def get_or_create_pitcher(cur, mlb_id, name, throws_hand):
-    cur.execute("SELECT id FROM pitchers WHERE mlb_id = ?", (mlb_id,))
-    row = cur.fetchone()
-    if row:
-        return row[0]
-
+SHARD_DIR = Path("data/shards")  # per-worker and staging databases, deleted after each run
+STAGING_PATH = SHARD_DIR / "staging.db"  # all shards, merged before touching DB_PATH
+SCHEMA_PATH = Path("db/schema.sql")
+PITCH_FLAGS_PATH = Path("db/pitch_flags.sql")  # shared with init_db's backfill
+PITCH_AGG_PATH = Path("db/pitch_agg.sql")
+BATCH_SIZE = 50_000  # pitches inserted (and committed) per executemany call
+UNKNOWN_PITCHER = "Unknown Pitcher"  # name stored when a pitcher's rows have none
+
+# Bulk-load settings for the ETL connection only; the API keeps its own.
+ETL_PRAGMAS = """
+PRAGMA journal_mode=WAL;
+PRAGMA synchronous=OFF;
+PRAGMA temp_store=MEMORY;
+PRAGMA cache_size=-262144;
+PRAGMA mmap_size=1073741824;
+PRAGMA busy_timeout=5000;
+"""
+
+INSERT_PITCH_SQL = """
+INSERT INTO pitches (
+    pitcher_id, game_date, inning, top_bottom,
+    batter_hand, balls, strikes,
+    pitch_type, velocity,
+    plate_x, plate_z, sz_top, sz_bot,
+    description, outcome, runs_value
+)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+# Merging a shard in file order reproduces the ids a sequential load would
+# assign: new pitchers append in first-seen order and pitcher_id is remapped
+# through mlb_id. A placeholder name never replaces a real one.
+MERGE_PITCHERS_SQL = """
+INSERT INTO main.pitchers (mlb_id, name, throws_hand)
+SELECT mlb_id, name, throws_hand
+FROM shard.pitchers
+WHERE true
+ORDER BY id
+ON CONFLICT (mlb_id) DO UPDATE SET name = COALESCE(NULLIF(excluded.name, :unknown), name)
+"""
+
+MERGE_PITCHES_SQL = """
+INSERT INTO main.pitches (
+    pitcher_id, game_date, inning, top_bottom,
+    batter_hand, balls, strikes,
+    pitch_type, velocity,
+    plate_x, plate_z, sz_top, sz_bot,
+    description, outcome, runs_value,
+    is_whiff, is_hard_hit
+)
+SELECT
+    p.id, s.game_date, s.inning, s.top_bottom,
+    s.batter_hand, s.balls, s.strikes,
+    s.pitch_type, s.velocity,
+    s.plate_x, s.plate_z, s.sz_top, s.sz_bot,
+    s.description, s.outcome, s.runs_value,
+    s.is_whiff, s.is_hard_hit
+FROM shard.pitches AS s
+JOIN shard.pitchers AS sp ON sp.id = s.pitcher_id
+JOIN main.pitchers AS p ON p.mlb_id = sp.mlb_id
+ORDER BY s.id
+"""
+
+
+def get_or_create_pitcher(cur, mlb_id, name, throws_hand, cache: dict[int, int]):
+    pitcher_id = cache.get(mlb_id)
+    if pitcher_id is not None:
+        return pitcher_id
+
+    # Pitchers seen in an earlier CSV / run keep their id but take the latest
+    # name; a missing name (None) only falls back to the placeholder on insert
     cur.execute(
         """
         INSERT INTO pitchers (mlb_id, name, throws_hand)
-        VALUES (?, ?, ?)
+        VALUES (:mlb_id, COALESCE(:name, :unknown), :throws_hand)
+        ON CONFLICT (mlb_id) DO UPDATE SET name = COALESCE(:name, name)
+        RETURNING id
         """,
-        (mlb_id, name, throws_hand),
+        {
+            "mlb_id": mlb_id,
+            "name": name,
+            "throws_hand": throws_hand,
+            "unknown": UNKNOWN_PITCHER,
+        },
     )
-    return cur.lastrowid
-
-
-def to_int(val):
-    try:
-        return int(val)
-    except (TypeError, ValueError):
-        return None
-
+    pitcher_id = cur.fetchone()[0]
+
+    cache[mlb_id] = pitcher_id
+    return pitcher_id
+
+
+def resolve_pitcher_ids(cur, mlb_ids, names, throws_hands, cache: dict[int, int]):
+    """Map a column of MLB pitcher ids to pitchers.id, creating new pitchers
+    in order of first appearance from their first row's name / hand."""
+    unique_ids = pc.unique(mlb_ids)
+    for mlb_id in unique_ids.to_pylist():
+        if mlb_id not in cache:
+            i = pc.index(mlb_ids, mlb_id).as_py()
+            get_or_create_pitcher(
+                cur,
+                mlb_id,
+                names[i].as_py() or None,
+                throws_hands[i].as_py() or "",
+                cache,
+            )
 
-def to_float(val):
-    try:
-        return float(val) if val not in ("", None) else None
-    except (TypeError, ValueError):
-        return None
+    pitcher_ids = pa.array(
+        [cache[mlb_id] for mlb_id in unique_ids.to_pylist()], pa.int64()
+    )
+    return pc.take(pitcher_ids, pc.index_in(mlb_ids, value_set=unique_ids))
+
+
+# Target types for every column the loader reads. pyarrow parses them all as
+# text (so empty or date-like columns are not inferred as null / date32) and
+# the numeric ones are coerced cell by cell in coerce_numeric.
+COLUMN_TYPES = {
+    "pitcher": pa.int64(),
+    "balls": pa.int64(),
+    "strikes": pa.int64(),
+    "inning": pa.int64(),
+    "release_speed": pa.float64(),
+    "plate_x": pa.float64(),
+    "plate_z": pa.float64(),
+    "sz_top": pa.float64(),
+    "sz_bot": pa.float64(),
+    "game_date": pa.string(),
+    "inning_topbot": pa.string(),
+    "stand": pa.string(),
+    "pitch_type": pa.string(),
+    "pitch_name": pa.string(),
+    "player_name": pa.string(),
+    "p_throws": pa.string(),
+    "description": pa.string(),
+    "events": pa.string(),
+}
+
+
+# Text pa.cast accepts for each numeric type; anything else becomes NULL, as
+# the old per-row int() / float() parsing did, instead of failing the file.
+NUMERIC_PATTERNS = {
+    pa.int64(): r"^-?\d{1,18}$",
+    pa.float64(): r"^-?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?$",
+}
+
+
+def coerce_numeric(values: pa.ChunkedArray, col_type: pa.DataType) -> pa.ChunkedArray:
+    text = pc.utf8_trim_whitespace(values)
+    text = pc.replace_substring_regex(text, pattern=r"^\+", replacement="")
+    valid = pc.match_substring_regex(text, NUMERIC_PATTERNS[col_type])
+    return pc.cast(pc.if_else(valid, text, None), col_type)
 
 
 def sanitize_header(name: str) -> str:
@@ -49,135 +176,193 @@ def process_csv(file_path: Path, conn: sqlite3.Connection):
 
     print(f"\n=== Loading CSV: {file_path.name} ===")
 
-    with file_path.open(newline="", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-
-        if not reader.fieldnames:
-            print(f"Skipping {file_path}: No header found.")
-            return
-
-        raw_headers = reader.fieldnames
-        print("Headers:", raw_headers[:10], " ...")
-
-        header_map = {sanitize_header(fn): fn for fn in raw_headers}
-
-        def col(name: str, fallback: str | None = None):
-            if name in header_map:
-                return header_map[name]
-            if fallback and fallback in header_map:
-                return header_map[fallback]
-            return None
-
-        pitch_type_col = col("pitch_type", "pitch_name")
-        pitcher_col = col("pitcher")
-        player_name_col = col("player_name")
-        p_throws_col = col("p_throws")
-        game_date_col = col("game_date")
-        stand_col = col("stand")
-        balls_col = col("balls")
-        strikes_col = col("strikes")
-        release_speed_col = col("release_speed")
-        plate_x_col = col("plate_x")
-        plate_z_col = col("plate_z")
-        sz_top_col = col("sz_top")
-        sz_bot_col = col("sz_bot")
-        inning_col = col("inning")
-        inning_tb_col = col("inning_topbot")
-        description_col = col("description")
-        events_col = col("events")
-
-        # Required columns?
-        if not pitcher_col or not pitch_type_col:
-            print(f"Skipping {file_path}: Required columns missing.")
-            return
-
-        row_count = 0
-
-        for row in reader:
-            row_count += 1
-
-            # Pitcher identity
-            pitcher_raw = row.get(pitcher_col)
-            if not pitcher_raw:
-                continue
-
-            pitcher_mlb_id = to_int(pitcher_raw)
-            if pitcher_mlb_id is None:
-                continue
-
-            pitcher_name = row.get(player_name_col) or "Unknown Pitcher"
-            throws_hand = row.get(p_throws_col) or ""
-
-            pitcher_id = get_or_create_pitcher(
-                cur, pitcher_mlb_id, pitcher_name, throws_hand
-            )
+    # Only the header line goes through Python (utf-8-sig drops the BOM the
+    # same way pyarrow does, so raw names match its column names)
+    with file_path.open(newline="", encoding="utf-8-sig") as f:
+        raw_headers = next(csv.reader(f), None)
+
+    if not raw_headers:
+        print(f"Skipping {file_path}: No header found.")
+        return
+
+    print("Headers:", raw_headers[:10], " ...")
+
+    header_map = {sanitize_header(fn): fn for fn in raw_headers}
+
+    def col(name: str, fallback: str | None = None):
+        if name in header_map:
+            return name
+        if fallback and fallback in header_map:
+            return fallback
+        return None
+
+    # Have pyarrow parse just the columns we load, keyed by their raw header
+    wanted = [header_map[name] for name in COLUMN_TYPES if name in header_map]
+
+    # A short or overlong row (e.g. a download cut off mid-line) drops just
+    # that row; ArrowInvalid is left for errors that spoil the whole file
+    bad_rows = []
+
+    def skip_row(row):
+        bad_rows.append(row.number)
+        return "skip"
+
+    try:
+        table = pa_csv.read_csv(
+            file_path,
+            parse_options=pa_csv.ParseOptions(invalid_row_handler=skip_row),
+            convert_options=pa_csv.ConvertOptions(
+                column_types={fn: pa.string() for fn in wanted},
+                include_columns=wanted,
+                strings_can_be_null=True,
+            ),
+        )
+    except pa.ArrowInvalid as e:
+        print(f"Skipping {file_path}: {e}")
+        return
+
+    if bad_rows:
+        print(f"Dropped {len(bad_rows)} malformed rows from {file_path.name}.")
 
-            # Game context
-            game_date = row.get(game_date_col) if game_date_col else None
-            inning = to_int(row.get(inning_col)) if inning_col else None
-
-            raw_tb = row.get(inning_tb_col)
-            if raw_tb:
-                t = raw_tb.strip().lower()
-                if t.startswith("t"):
-                    inning_topbot = "Top"
-                elif t.startswith("b"):
-                    inning_topbot = "Bottom"
-                else:
-                    inning_topbot = None
-            else:
-                inning_topbot = None
-
-            batter_hand = row.get(stand_col) or None
-            balls = to_int(row.get(balls_col)) if balls_col else None
-            strikes = to_int(row.get(strikes_col)) if strikes_col else None
-
-            pitch_type = row.get(pitch_type_col)
-            if not pitch_type:
-                continue
-
-            # Numbers
-            velocity = to_float(row.get(release_speed_col))
-            plate_x = to_float(row.get(plate_x_col))
-            plate_z = to_float(row.get(plate_z_col))
-            sz_top = to_float(row.get(sz_top_col))
-            sz_bot = to_float(row.get(sz_bot_col))
-
-            description = row.get(description_col) or ""
-            outcome = row.get(events_col) or None
-
-            cur.execute(
-                """
-                INSERT INTO pitches (
-                    pitcher_id, game_date, inning, top_bottom,
-                    batter_hand, balls, strikes,
-                    pitch_type, velocity,
-                    plate_x, plate_z, sz_top, sz_bot,
-                    description, outcome, runs_value
-                )
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """,
-                (
-                    pitcher_id,
-                    game_date,
-                    inning,
-                    inning_topbot,
-                    batter_hand,
-                    balls,
-                    strikes,
-                    pitch_type,
-                    velocity,
-                    plate_x,
-                    plate_z,
-                    sz_top,
-                    sz_bot,
-                    description,
-                    outcome,
-                    None,  # runs_value placeholder
-                ),
+    table = table.rename_columns([sanitize_header(fn) for fn in table.column_names])
+
+    # A bad numeric cell nulls just that cell, not the whole file
+    for i, name in enumerate(table.column_names):
+        col_type = COLUMN_TYPES[name]
+        if col_type != pa.string():
+            table = table.set_column(
+                i, name, coerce_numeric(table.column(i), col_type)
             )
 
-        print(f"Finished {file_path.name}: {row_count} rows processed.")
+    pitch_type_col = col("pitch_type", "pitch_name")
+    pitcher_col = col("pitcher")
+
+    # Required columns?
+    if not pitcher_col or not pitch_type_col:
+        print(f"Skipping {file_path}: Required columns missing.")
+        return
+
+    pitcher_cache: dict[int, int] = {}  # mlb_id -> pitchers.id
+
+    for offset in range(0, table.num_rows, BATCH_SIZE):
+        chunk = table.slice(offset, BATCH_SIZE)
+        chunk = chunk.filter(pc.is_valid(chunk.column(pitcher_col)))
+
+        def column(name: str | None, fallback: str | None = None):
+            name = col(name, fallback) if name else None
+            if name is None:
+                return pa.nulls(chunk.num_rows, pa.string())
+            return chunk.column(name)
+
+        pitcher_ids = resolve_pitcher_ids(
+            cur,
+            column("pitcher"),
+            column("player_name"),
+            column("p_throws"),
+            pitcher_cache,
+        )
+
+        raw_tb = pc.utf8_lower(pc.utf8_trim_whitespace(column("inning_topbot")))
+        inning_topbot = pc.if_else(
+            pc.starts_with(raw_tb, "t"),
+            "Top",
+            pc.if_else(
+                pc.starts_with(raw_tb, "b"),
+                "Bottom",
+                pa.scalar(None, pa.string()),
+            ),
+        )
+
+        # Insert order
+        insert_cols = [
+            pitcher_ids,
+            column("game_date"),
+            column("inning"),
+            inning_topbot,
+            column("stand"),
+            column("balls"),
+            column("strikes"),
+            column("pitch_type", "pitch_name"),
+            column("release_speed"),
+            column("plate_x"),
+            column("plate_z"),
+            column("sz_top"),
+            column("sz_bot"),
+            pc.fill_null(column("description"), ""),
+            column("events"),
+            pa.nulls(chunk.num_rows),  # runs_value placeholder
+        ]
+
+        # Pitchers are registered above even for rows skipped here
+        has_pitch_type = pc.is_valid(column("pitch_type", "pitch_name"))
+        batch = zip(
+            *(pc.filter(c, has_pitch_type).to_pylist() for c in insert_cols)
+        )
+
+        # sqlite3 opens the transaction implicitly; one commit per batch
+        cur.executemany(INSERT_PITCH_SQL, batch)
+        conn.commit()
+
+    print(f"Finished {file_path.name}: {table.num_rows} rows processed.")
+
+
+def open_shard(shard_path: Path) -> sqlite3.Connection:
+    shard_path.unlink(missing_ok=True)
+    conn = sqlite3.connect(shard_path)
+    conn.executescript(ETL_PRAGMAS)
+    with SCHEMA_PATH.open() as f:
+        conn.executescript(f.read())
+    return conn
+
+
+def load_shard(file_path: Path, shard_path: Path) -> Path:
+    """Worker: load one CSV into its own fresh database so files parse in parallel."""
+    conn = open_shard(shard_path)
+
+    process_csv(file_path, conn)
+    # Flags come from the same SQL init_db backfills with, in one pass over the shard
+    conn.execute(PITCH_FLAGS_PATH.read_text())
+
+    conn.commit()
+    conn.close()
+    return shard_path
+
+
+def merge_shard(conn: sqlite3.Connection, shard_path: Path):
+    conn.execute("ATTACH DATABASE ? AS shard", (str(shard_path),))
+    conn.execute(MERGE_PITCHERS_SQL, {"unknown": UNKNOWN_PITCHER})
+    conn.execute(MERGE_PITCHES_SQL)
+    # ATTACH / DETACH are not allowed inside a transaction
+    conn.commit()
+    conn.execute("DETACH DATABASE shard")
+    shard_path.unlink()
+
+
+def publish_staging(conn: sqlite3.Connection, staging_path: Path):
+    """Merge the staged load and rebuild pitch_agg in one transaction, so the
+    main database gets every file or, if anything fails, none of them."""
+    conn.execute("ATTACH DATABASE ? AS shard", (str(staging_path),))
+    try:
+        with conn:
+            conn.execute(MERGE_PITCHERS_SQL, {"unknown": UNKNOWN_PITCHER})
+            conn.execute(MERGE_PITCHES_SQL)
+            rebuild_pitch_agg(conn)
+    finally:
+        conn.execute("DETACH DATABASE shard")
+
+
+def rebuild_pitch_agg(conn: sqlite3.Connection):
+    print("\nRebuilding pitch_agg ...")
+    conn.execute("DELETE FROM pitch_agg")
+    conn.execute(PITCH_AGG_PATH.read_text())
+
+
+def schema_is_current(conn: sqlite3.Connection) -> bool:
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(pitches)")}
+    has_agg = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'pitch_agg'"
+    ).fetchone()
+    return {"is_whiff", "is_hard_hit"} <= columns and has_agg is not None
 
 
 def main():
@@ -185,8 +370,6 @@ def main():
         print(f"Directory {CSV_DIR} not found.")
         return
 
-    conn = sqlite3.connect(DB_PATH)
-
     csv_files = list(CSV_DIR.glob("*.csv"))
     if not csv_files:
         print("No CSV files found in data/csvs/")
@@ -194,11 +377,36 @@ def main():
 
     print(f"Found {len(csv_files)} CSVs.")
 
-    for file_path in csv_files:
-        process_csv(file_path, conn)
+    # An older database fails on the new columns only at publish time, after
+    # every file has loaded; catch it up front with a clear next step
+    if not DB_PATH.exists():
+        print(f"{DB_PATH} not found; run python db/init_db.py first.")
+        return
+    conn = sqlite3.connect(DB_PATH)
+    if not schema_is_current(conn):
+        conn.close()
+        print(f"{DB_PATH} is out of date; run python db/init_db.py to migrate it.")
+        return
+    conn.executescript(ETL_PRAGMAS)
+
+    SHARD_DIR.mkdir(exist_ok=True)
+    shard_paths = [SHARD_DIR / f"shard_{i}.db" for i in range(len(csv_files))]
+
+    staging = open_shard(STAGING_PATH)
+    try:
+        workers = min(len(csv_files), os.cpu_count() or 1)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            # map() yields in file order, so shards merge while later files load
+            for shard_path in pool.map(load_shard, csv_files, shard_paths):
+                merge_shard(staging, shard_path)
+        staging.close()
+
+        publish_staging(conn, STAGING_PATH)
+    finally:
+        staging.close()
+        conn.close()
+        shutil.rmtree(SHARD_DIR, ignore_errors=True)
 
-    conn.commit()
-    conn.close()
     print("\nAll CSVs ingested successfully.")
 
 